@@ -1,12 +1,116 @@
+import os
+from datetime import date
+from functools import lru_cache
+
 import dash
 from dash import dcc, html, Input, Output
+from dash.exceptions import PreventUpdate
+from flask_caching import Cache
 import plotly.express as px
 import duckdb
-import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from tsdownsample import MinMaxLTTBDownsampler
+
+
+DATABASE_PATH = "../air_quality.db"
+# Touched by the pipeline whenever new data lands in the database
+REFRESH_MARKER_PATH = f"{DATABASE_PATH}.refreshed"
+CACHE_TIMEOUT = 300
+# The map and dropdown contents only change when the pipeline runs
+LONG_CACHE_TIMEOUT = 600
+# Share cached results between dashboard workers, e.g. redis://localhost:6379/0
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL")
+# Maximum points drawn per location on the line plot
+LINE_PLOT_MAX_POINTS = 1000
+# String columns plotly groups and colors on, sent as categoricals
+CATEGORICAL_COLUMNS = ("location",)
 
 
 app = dash.Dash(__name__)
 
+cache = Cache(app.server, config={
+      "CACHE_TYPE": "RedisCache" if CACHE_REDIS_URL else "SimpleCache",
+      "CACHE_REDIS_URL": CACHE_REDIS_URL,
+      "CACHE_DEFAULT_TIMEOUT": CACHE_TIMEOUT
+})
+
+
+def get_refresh_marker_mtime() -> float:
+    try:
+        return os.path.getmtime(REFRESH_MARKER_PATH)
+    except OSError:
+        return 0.0
+
+
+@cache.memoize(timeout=CACHE_TIMEOUT)
+def fetch_query(query: str, parameters: tuple, refreshed_at: float):
+    """Run a read-only query, cached until the timeout expires or the pipeline refreshes the database."""
+    # Connect per cache miss so the pipeline can take the write lock between queries
+    with duckdb.connect(DATABASE_PATH, read_only=True) as db_connection:
+        return db_connection.execute(query, list(parameters)).fetch_arrow_table()
+
+
+def run_query(query: str, parameters=()):
+    return fetch_query(query, tuple(parameters), get_refresh_marker_mtime())
+
+
+def get_latest_values() -> pa.Table:
+    return run_query("SELECT * FROM presentation.latest_param_values_per_location")
+
+
+def get_date_bounds():
+    bounds = run_query("""
+        SELECT MIN(measurement_date), MAX(measurement_date)
+        FROM presentation.daily_air_quality_stats
+    """)
+    return bounds.column(0)[0].as_py(), bounds.column(1)[0].as_py()
+
+
+@lru_cache(maxsize=256)
+def parse_date(value: str) -> date:
+    # Date pickers send YYYY-MM-DD, sometimes followed by a time part
+    return date.fromisoformat(value[:10])
+
+
+def encode_categories(table: pa.Table) -> pa.Table:
+    """Dictionary-encode categorical columns so plotly groups on integer codes."""
+    for column in CATEGORICAL_COLUMNS:
+        if column in table.column_names:
+            table = table.set_column(
+                table.schema.get_field_index(column),
+                column,
+                pc.dictionary_encode(table.column(column))
+            )
+    return table
+
+
+def downsample_series(series, n_out: int = LINE_PLOT_MAX_POINTS):
+    """Thin each location's series with MinMaxLTTB. Rows must be ordered by location, then date."""
+    if series.num_rows <= n_out:
+        return series
+
+    locations = series.column("location").to_numpy()
+    x = series.column("measurement_date").cast(pa.int32()).to_numpy().astype("int64")
+    y = series.column("average_value").to_numpy()
+
+    boundaries = np.flatnonzero(locations[1:] != locations[:-1]) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(locations)]))
+
+    downsampler = MinMaxLTTBDownsampler()
+    keep = []
+    for start, end in zip(starts, ends):
+        if end - start <= n_out:
+            keep.append(np.arange(start, end))
+        else:
+            # downsample returns uint64 indices, which would promote start + indices to float
+            indices = downsampler.downsample(x[start:end], y[start:end], n_out=n_out).astype(np.int64)
+            keep.append(start + indices)
+
+    return series.take(np.concatenate(keep))
+
 
 app.layout = html.Div([
       html.H1(
@@ -49,25 +153,17 @@ app.layout = html.Div([
       ])
 ], style={"padding": "10px", "height": "100vh", "boxSizing": "border-box"})
 
-@app.callback(
-      Output("map-view", "figure"),
-      Input("map-view", "id")
-)
-def update_map(_):
-
-      with duckdb.connect("../air_quality.db", read_only=True) as db_connection:
-        latest_values_df = db_connection.execute(
-            "SELECT * FROM presentation.latest_param_values_per_location"
-        ).fetchdf()
+@cache.memoize(timeout=LONG_CACHE_TIMEOUT)
+def build_map(refreshed_at: float):
 
-      latest_values_df.fillna(0, inplace=True)
+      latest_values = get_latest_values()
 
       # Calculate center of all locations
-      center_lat = latest_values_df["lat"].mean()
-      center_lon = latest_values_df["lon"].mean()
+      center_lat = pc.mean(latest_values.column("lat")).as_py()
+      center_lon = pc.mean(latest_values.column("lon")).as_py()
 
       map_fig = px.scatter_mapbox(
-            latest_values_df,
+            latest_values.to_pandas(),
             lat="lat",
             lon="lon",
             hover_name="location",
@@ -98,59 +194,62 @@ def update_map(_):
 
 
 @app.callback(
-    [
-        Output("parameter-dropdown", "options"),
-        Output("parameter-dropdown", "value"),
-        Output("date-picker-range", "start_date"),
-        Output("date-picker-range", "end_date"),
-    ],
-    Input("parameter-dropdown", "id"),
+      Output("map-view", "figure"),
+      Input("map-view", "id")
 )
-def update_dropdowns(_):
-    with duckdb.connect("../air_quality.db", read_only=True) as db_connection:
-        df = db_connection.execute(
-            "SELECT * FROM presentation.daily_air_quality_stats"
-        ).fetchdf()
+def update_map(_):
+      return build_map(get_refresh_marker_mtime())
+
+
+@cache.memoize(timeout=LONG_CACHE_TIMEOUT)
+def build_dropdowns(refreshed_at: float):
+    parameters = run_query("""
+        SELECT DISTINCT parameter
+        FROM presentation.daily_air_quality_stats
+        ORDER BY parameter
+    """).column("parameter").to_pylist()
 
     parameter_options = [
         {"label": parameter, "value": parameter}
-        for parameter in df["parameter"].unique()
+        for parameter in parameters
     ]
-    start_date = df["measurement_date"].min()
-    end_date = df["measurement_date"].max()
+    start_date, end_date = get_date_bounds()
 
     return (
         parameter_options,
-        df["parameter"].unique()[0],
+        parameters[0],
         start_date,
         end_date,
     )
 
 
 @app.callback(
-      [Output("line-plot", "figure"), Output("bar-plot", "figure")],
-      [
-            Input("parameter-dropdown", "value"),
-            Input("date-picker-range", "start_date"),
-            Input("date-picker-range", "end_date")
-      ]
+    [
+        Output("parameter-dropdown", "options"),
+        Output("parameter-dropdown", "value"),
+        Output("date-picker-range", "start_date"),
+        Output("date-picker-range", "end_date"),
+    ],
+    Input("parameter-dropdown", "id"),
 )
-def update_plots(selected_parameter, start_date, end_date):
+def update_dropdowns(_):
+    return build_dropdowns(get_refresh_marker_mtime())
+
 
-      with duckdb.connect("../air_quality.db", read_only=True) as db_connection:
-        daily_stats_df = db_connection.execute(
-            "SELECT * FROM presentation.daily_air_quality_stats"
-        ).fetchdf()
+@cache.memoize(timeout=CACHE_TIMEOUT)
+def build_plots(selected_parameter: str, start_date: date, end_date: date, refreshed_at: float):
 
       # Filter by parameter and date only (show all locations)
-      filtered_df = daily_stats_df[daily_stats_df["parameter"] == selected_parameter]
-      filtered_df = filtered_df[
-            (filtered_df["measurement_date"] >= pd.to_datetime(start_date))
-            & (filtered_df["measurement_date"] <= pd.to_datetime(end_date))
-      ]
+      daily_series = run_query("""
+            SELECT measurement_date, location, average_value, units
+            FROM presentation.daily_air_quality_stats
+            WHERE parameter = ? AND measurement_date BETWEEN ? AND ?
+            ORDER BY location, measurement_date
+      """, [selected_parameter, start_date, end_date])
 
       # Get the unit for labels
-      unit = filtered_df["units"].unique()[0] if len(filtered_df["units"].unique()) > 0 else "Value"
+      units = daily_series.column("units").unique().to_pylist()
+      unit = units[0] if len(units) > 0 else "Value"
 
       labels = {
         "average_value": unit,
@@ -160,7 +259,7 @@ def update_plots(selected_parameter, start_date, end_date):
 
       # Line plot with all locations (different colors for each location)
       line_fig = px.line(
-            filtered_df.sort_values(by=["location", "measurement_date"]),
+            encode_categories(downsample_series(daily_series)).to_pandas(),
             x="measurement_date",
             y="average_value",
             color="location",
@@ -185,11 +284,32 @@ def update_plots(selected_parameter, start_date, end_date):
       )
 
       # Bar chart showing average values by location
-      avg_by_location = filtered_df.groupby("location")["average_value"].mean().reset_index()
-      avg_by_location = avg_by_location.sort_values(by="average_value", ascending=False)
+      avg_by_location = None
+      first_date, last_date = get_date_bounds()
+      if first_date is not None and start_date <= first_date and end_date >= last_date:
+            # Whole history selected, so the precomputed aggregates apply
+            try:
+                  avg_by_location = run_query("""
+                        SELECT location, value_sum / value_count AS average_value
+                        FROM presentation.location_stats
+                        WHERE parameter = ?
+                        ORDER BY average_value DESC
+                  """, [selected_parameter])
+            except duckdb.CatalogException:
+                  # Databases transformed before location_stats existed don't have the table yet
+                  pass
+
+      if avg_by_location is None:
+            avg_by_location = run_query("""
+                  SELECT location, AVG(average_value) AS average_value
+                  FROM presentation.daily_air_quality_stats
+                  WHERE parameter = ? AND measurement_date BETWEEN ? AND ?
+                  GROUP BY location
+                  ORDER BY average_value DESC
+            """, [selected_parameter, start_date, end_date])
 
       bar_fig = px.bar(
-            avg_by_location,
+            encode_categories(avg_by_location).to_pandas(),
             x="location",
             y="average_value",
             labels={"average_value": unit, "location": "Location"},
@@ -209,5 +329,26 @@ def update_plots(selected_parameter, start_date, end_date):
       return line_fig, bar_fig
 
 
+@app.callback(
+      [Output("line-plot", "figure"), Output("bar-plot", "figure")],
+      [
+            Input("parameter-dropdown", "value"),
+            Input("date-picker-range", "start_date"),
+            Input("date-picker-range", "end_date")
+      ]
+)
+def update_plots(selected_parameter, start_date, end_date):
+      # Fires before update_dropdowns has filled the inputs
+      if not selected_parameter or not start_date or not end_date:
+            raise PreventUpdate
+
+      return build_plots(
+            selected_parameter,
+            parse_date(start_date),
+            parse_date(end_date),
+            get_refresh_marker_mtime()
+      )
+
+
 if __name__ == "__main__":
     app.run_server(debug=True)
\ No newline at end of file
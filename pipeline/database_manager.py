@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import List
 import os
 import argparse
@@ -23,6 +24,18 @@ def close_database_connection(con: DuckDBPyConnection) -> None:
     con.close()
 
 
+def get_refresh_marker_path(database_path: str) -> str:
+    return f"{database_path}.refreshed"
+
+
+def touch_refresh_marker(database_path: str) -> None:
+    """Bump the marker file the dashboard watches to invalidate its cached query results."""
+    marker_path = get_refresh_marker_path(database_path)
+    with open(marker_path, "a"):
+        os.utime(marker_path, None)
+    logging.info(f"Touched refresh marker at {marker_path}")
+
+
 def collect_query_paths(parent_dir: str) -> List[str]:
     
     sql_files = []
@@ -38,27 +51,41 @@ def collect_query_paths(parent_dir: str) -> List[str]:
     return sorted(sql_files)
 
 
-def read_query(path: str) -> str:
+@lru_cache(maxsize=64)
+def read_query_cached(path: str, modified_at: float) -> str:
     with open(path, "r") as f:
-        query = f.read()
-        f.close()
-    return query
+        return f.read()
+
+
+def read_query(path: str) -> str:
+    # Keyed on the modification time so edited files are read again
+    return read_query_cached(path, os.path.getmtime(path))
 
 
 def execute_query(con: DuckDBPyConnection, query: str) -> None:
     con.execute(query)
 
 
+def execute_script(con: DuckDBPyConnection, queries: List[str]) -> None:
+    """Execute queries as one script in a single transaction."""
+    script = "\n".join(f"{query.strip().rstrip(';')}\n;" for query in queries)
+    con.begin()
+    try:
+        con.execute(script)
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+
+
 def setup_database(database_path: str, ddl_query_parent_dir: str) -> None:
     
     query_paths = collect_query_paths(ddl_query_parent_dir)
 
     con = connect_to_database(database_path)
 
-    for query_path in query_paths:
-        query = read_query(query_path)
-        execute_query(con, query)
-        logging.info(f"Executed query from {query_path}")
+    execute_script(con, [read_query(query_path) for query_path in query_paths])
+    logging.info(f"Executed {len(query_paths)} queries from {ddl_query_parent_dir}")
     
     close_database_connection(con)
 
@@ -67,6 +94,10 @@ def destroy_database(database_path: str) -> None:
     if os.path.exists(database_path):
         os.remove(database_path)
 
+    marker_path = get_refresh_marker_path(database_path)
+    if os.path.exists(marker_path):
+        os.remove(marker_path)
+
 
 def main():
 
@@ -7,10 +7,13 @@ Example usage:
 import argparse
 import json
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 from typing import List, Optional, Tuple
 
+import pandas as pd
 from duckdb import IOException
 from jinja2 import Template
 
@@ -18,17 +21,23 @@ from database_manager import (
     connect_to_database,
     close_database_connection,
     execute_query,
-    read_query
+    read_query,
+    touch_refresh_marker
+)
+
+# Per-path extraction is bound by S3 latency, not CPU
+MAX_EXTRACTION_WORKERS = 16
+
+LOCATION_STATS_QUERY_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..", "sql", "dml", "presentation", "3_presentation_location_stats_table.sql"
 )
 
 
 def read_location_ids(file_path: str) -> List[str]:
+    # JSON object keys are already strings
     with open(file_path, "r") as f:
-        locations = json.load(f)
-        f.close()
-
-    location_ids = [str(id) for id in locations.keys()]
-    return location_ids
+        return list(json.load(f))
 
 
 def get_last_extraction_date(con) -> Optional[str]:
@@ -47,18 +56,16 @@ def get_last_extraction_date(con) -> Optional[str]:
         return None
 
 
-def determine_date_range(con, incremental: bool) -> Tuple[str, str]:
+def determine_date_range(last_end_date: Optional[str], incremental: bool) -> Tuple[str, str]:
     """Determine the date range for extraction.
 
     If incremental mode:
-        - Start from the month after last successful extraction
+        - Start from the month after last_end_date, the last successful extraction
         - End at current month
     Otherwise:
         - Requires manual start_date and end_date
     """
     if incremental:
-        last_end_date = get_last_extraction_date(con)
-
         if last_end_date:
             # Start from the month after the last extraction
             last_end_dt = datetime.strptime(last_end_date, "%Y-%m")
@@ -119,53 +126,88 @@ def log_extraction_failed(con, extraction_id: int, error_message: str):
     logging.error(f"Failed extraction job {extraction_id}: {error_message}")
 
 
+def to_year_month_key(date: str) -> int:
+    """Convert a YYYY-MM date to its integer YYYYMM key. Raises ValueError on malformed dates."""
+    date_dt = datetime.strptime(date, "%Y-%m")
+    return date_dt.year * 100 + date_dt.month
+
+
+def month_range(start_date: str, end_date: str) -> pd.DatetimeIndex:
+    """First day of every month from start_date to end_date (YYYY-MM), inclusive."""
+    return pd.date_range(start_date, end_date, freq="MS")
+
+
 def compile_data_file_paths(
-    data_file_path_template: str, location_ids: List[str], start_date: str, end_date: str
+    location_ids: List[str], start_date: str, end_date: str
 ) -> List[str]:
-    
-    start_date = datetime.strptime(start_date, "%Y-%m")
-    end_date = datetime.strptime(end_date, "%Y-%m")
-
-    data_file_paths = []
-    for location_id in location_ids:
-        index_date = start_date
-        while index_date <= end_date:
-            data_file_path = Template(data_file_path_template).render(
-                location_id=location_id,
-                year=str(index_date.year),
-                month=str(index_date.month).zfill(2)
-            )
-            data_file_paths.append(data_file_path)
-            index_date += relativedelta(months=1)
-    return data_file_paths
+    months = month_range(start_date, end_date)
+    return [
+        f"locationid={location_id}/year={month.year}/month={month.month:02d}/*"
+        for location_id in location_ids
+        for month in months
+    ]
 
 def compile_data_file_query(
-    base_path: str, data_file_path: str, extract_query_template: str
+    base_path: str, data_file_paths: List[str], extract_query_template: Template
 ) -> str:
-    extract_query = Template(extract_query_template).render(
-        data_file_path=f"{base_path}/{data_file_path}"
+    quoted_paths = [
+        "'" + f"{base_path}/{data_file_path}".replace("'", "''") + "'"
+        for data_file_path in data_file_paths
+    ]
+    extract_query = extract_query_template.render(
+        data_file_paths=f"[{', '.join(quoted_paths)}]"
     )
     return extract_query
 
 
+def extract_data_file(
+    con, base_path: str, data_file_path: str, extract_query_template: Template
+) -> bool:
+    """Extract a single data file path on its own cursor. Returns False if the path has no data."""
+    logging.info(f"Extracting data from {data_file_path}")
+    query = compile_data_file_query(
+        base_path=base_path,
+        data_file_paths=[data_file_path],
+        extract_query_template=extract_query_template
+    )
+
+    # Opened here so only as many cursors as pool workers exist at once
+    with con.cursor() as cursor:
+        try:
+            execute_query(cursor, query)
+        except IOException as e:
+            logging.warning(f"Could not find data from {data_file_path}: {e}")
+            return False
+
+    logging.info(f"Extracted data from {data_file_path}!")
+    return True
+
+
 def delete_existing_data(con, start_date: str, end_date: str):
     """Delete existing data for the specified date range before extracting new data."""
 
-    start_dt = datetime.strptime(start_date, "%Y-%m")
-    end_dt = datetime.strptime(end_date, "%Y-%m")
-
-    # Delete data for the entire date range
-    index_date = start_dt
-    while index_date <= end_dt:
-        delete_query = f"""
+    # Delete data for the entire date range in a single scan
+    deleted_rows = con.execute("""
         DELETE FROM raw.air_quality
-        WHERE year = {index_date.year} AND month = '{str(index_date.month).zfill(2)}';
-        """
-        logging.info(f"Deleting existing data for {index_date.year}-{str(index_date.month).zfill(2)}")
-        execute_query(con, delete_query)
-        index_date += relativedelta(months=1)
+        WHERE year * 100 + CAST(month AS INTEGER) BETWEEN ? AND ?
+    """, [to_year_month_key(start_date), to_year_month_key(end_date)]).fetchone()[0]
+
+    logging.info(f"Deleted {deleted_rows} existing records from {start_date} to {end_date}")
+
+
+def refresh_location_stats(con) -> None:
+    """Rebuild presentation.location_stats so it matches the freshly extracted data."""
+    view_exists = con.execute("""
+        SELECT COUNT(*) FROM duckdb_views()
+        WHERE schema_name = 'presentation' AND view_name = 'daily_air_quality_stats'
+    """).fetchone()[0]
 
-    logging.info(f"Deleted all existing data from {start_date} to {end_date}")
+    if not view_exists:
+        logging.info("Presentation views not created yet, skipping location stats refresh")
+        return
+
+    execute_query(con, read_query(LOCATION_STATS_QUERY_PATH))
+    logging.info("Refreshed presentation.location_stats")
 
 
 def extract_data(args):
@@ -176,7 +218,8 @@ def extract_data(args):
     try:
         # Determine date range
         if args.incremental:
-            start_date, end_date = determine_date_range(con, incremental=True)
+            last_end_date = get_last_extraction_date(con)
+            start_date, end_date = determine_date_range(last_end_date, incremental=True)
         else:
             if not args.start_date or not args.end_date:
                 raise ValueError("start_date and end_date are required when not in incremental mode")
@@ -184,61 +227,76 @@ def extract_data(args):
             end_date = args.end_date
 
         # Check if there's new data to extract
-        if args.incremental:
-            last_end_date = get_last_extraction_date(con)
-            if last_end_date:
-                last_end_dt = datetime.strptime(last_end_date, "%Y-%m")
-                current_month = datetime.now().replace(day=1)
-                if last_end_dt >= current_month:
-                    logging.info("No new data to extract. Already up to date.")
-                    close_database_connection(con)
-                    return
+        if args.incremental and last_end_date:
+            last_end_dt = datetime.strptime(last_end_date, "%Y-%m")
+            current_month = datetime.now().replace(day=1)
+            if last_end_dt >= current_month:
+                logging.info("No new data to extract. Already up to date.")
+                return
 
         # Log extraction start
         extraction_id = log_extraction_start(con, start_date, end_date)
 
         # Compile file paths
-        data_file_path_template = "locationid={{location_id}}/year={{year}}/month={{month}}/*"
         data_file_paths = compile_data_file_paths(
-            data_file_path_template=data_file_path_template,
             location_ids=location_ids,
             start_date=start_date,
             end_date=end_date
         )
 
-        extract_query_template = read_query(path=args.extract_query_template_path)
+        # Compile the query template once, it is rendered for every extraction query
+        extract_query_template = Template(read_query(path=args.extract_query_template_path))
 
         # Delete existing data before extracting new data (only in non-incremental mode)
         if not args.incremental:
             logging.info("Deleting existing data for the specified date range...")
             delete_existing_data(con, start_date, end_date)
 
-        # Extract data
-        successful_extractions = 0
-        for data_file_path in data_file_paths:
-            logging.info(f"Extracting data from {data_file_path}")
-            query = compile_data_file_query(
-                base_path=args.source_base_path,
-                data_file_path=data_file_path,
-                extract_query_template=extract_query_template
-            )
-
+        # Extract data in a single scan over all paths, so DuckDB fetches the files in parallel
+        if not data_file_paths:
+            logging.info("No data file paths to extract")
+        else:
             try:
+                logging.info(f"Extracting data from {len(data_file_paths)} paths in a single query")
+                query = compile_data_file_query(
+                    base_path=args.source_base_path,
+                    data_file_paths=data_file_paths,
+                    extract_query_template=extract_query_template
+                )
                 execute_query(con, query)
-                successful_extractions += 1
-                logging.info(f"Extracted data from {data_file_path}!")
+                successful_extractions = len(data_file_paths)
+                logging.info(f"Extracted data from {successful_extractions} paths!")
             except IOException as e:
-                logging.warning(f"Could not find data from {data_file_path}: {e}")
+                # At least one path is missing, fall back to extracting each path on its own
+                logging.warning(f"Batch extraction failed, extracting each path separately: {e}")
+                with ThreadPoolExecutor(max_workers=MAX_EXTRACTION_WORKERS) as executor:
+                    futures = [
+                        executor.submit(
+                            extract_data_file,
+                            con,
+                            args.source_base_path,
+                            data_file_path,
+                            extract_query_template
+                        )
+                        for data_file_path in data_file_paths
+                    ]
+                    successful_extractions = sum(future.result() for future in as_completed(futures))
+                logging.info(f"Extracted data from {successful_extractions} of {len(data_file_paths)} paths")
 
         # Get total records extracted
         records_extracted = con.execute("""
             SELECT COUNT(*) FROM raw.air_quality
-            WHERE year || '-' || month >= ? AND year || '-' || month <= ?
-        """, [start_date, end_date]).fetchone()[0]
+            WHERE year * 100 + CAST(month AS INTEGER) BETWEEN ? AND ?
+        """, [to_year_month_key(start_date), to_year_month_key(end_date)]).fetchone()[0]
+
+        refresh_location_stats(con)
 
         # Log extraction completion
         log_extraction_complete(con, extraction_id, records_extracted)
 
+        # Let the dashboard know its cached query results are stale
+        touch_refresh_marker(args.database_path)
+
     except Exception as e:
         if 'extraction_id' in locals():
             log_extraction_failed(con, extraction_id, str(e))
@@ -11,7 +11,7 @@ import os
 from database_manager import (
     connect_to_database,
     close_database_connection,
-    execute_query,
+    execute_script,
     read_query
 )
 
@@ -35,14 +35,11 @@ def setup_database(database_path: str):
             "2_metadata_extraction_log.sql"
         ]
 
-        for script_name in ddl_scripts:
-            script_path = os.path.join(sql_dir, script_name)
-            logging.info(f"Executing {script_name}...")
-
-            query = read_query(script_path)
-            execute_query(con, query)
-
-            logging.info(f"Successfully executed {script_name}")
+        # Run all scripts in one call so the schema is created atomically
+        logging.info(f"Executing {', '.join(ddl_scripts)}...")
+        queries = [read_query(os.path.join(sql_dir, script_name)) for script_name in ddl_scripts]
+        execute_script(con, queries)
+        logging.info(f"Successfully executed {len(ddl_scripts)} scripts")
 
         logging.info("Database setup completed successfully!")
 
@@ -10,6 +10,7 @@ from database_manager import (
     execute_query,
     collect_query_paths,
     read_query,
+    touch_refresh_marker,
 )
 
 
@@ -26,6 +27,7 @@ def transform_data(args) -> None:
         logging.info(f"Executed query from {query_path}")
 
     close_database_connection(con)
+    touch_refresh_marker(database_path)
 
 
 def main():
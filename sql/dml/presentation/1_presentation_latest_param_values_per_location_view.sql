@@ -11,8 +11,9 @@ WITH ranked_data AS (
     ROW_NUMBER() OVER (PARTITION BY location_id, parameter ORDER BY datetime DESC) AS rn
   FROM
     presentation.air_quality
-)
-PIVOT (
+),
+pivoted_data AS (
+  PIVOT (
 	SELECT
 		location_id,
 	    location,
@@ -23,6 +24,17 @@ PIVOT (
 	    datetime
 	FROM ranked_data
 	WHERE rn = 1
+  )
+  ON parameter IN ('pm10', 'pm25', 'so2')
+  USING FIRST("value")
 )
-ON parameter IN ('pm10', 'pm25', 'so2')
-USING FIRST("value");
\ No newline at end of file
+SELECT
+  location_id,
+  location,
+  lat,
+  lon,
+  datetime,
+  COALESCE(pm10, 0) AS pm10,
+  COALESCE(pm25, 0) AS pm25,
+  COALESCE(so2, 0) AS so2
+FROM pivoted_data;
@@ -0,0 +1,10 @@
+CREATE OR REPLACE TABLE presentation.location_stats AS
+SELECT
+    parameter,
+    location,
+    SUM(average_value) AS value_sum,
+    COUNT(average_value) AS value_count
+FROM presentation.daily_air_quality_stats
+GROUP BY
+    parameter,
+    location;
@@ -12,4 +12,4 @@ SELECT
     "month", 
     "year",
     current_timestamp AS ingestion_datetime
-FROM read_csv('{{ data_file_path }}');
\ No newline at end of file
+FROM read_csv({{ data_file_paths }}, union_by_name = true);
\ No newline at end of file